@@ -4,18 +4,39 @@
 FastAPI interface for the VisionOCR application.
 """
 
+import asyncio
 import base64
+import hmac
 import imghdr
 import logging
 import os
+import time
 import uuid
 from typing import Dict, Optional
 
-from config import DEFAULT_PROVIDER, SUPPORTED_PROVIDERS, SYSTEM_PROMPT, setup_logging
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
-from image_processor import ImageProcessor
+from config import (
+    DEFAULT_ENCODING_PROFILE,
+    DEFAULT_PROVIDER,
+    DEFAULT_REQUEST_DEADLINE,
+    DISCONNECT_POLL_INTERVAL,
+    ENCODING_PROFILES,
+    HEDGE_ENABLED,
+    MAX_RAW_BODY_BYTES,
+    MAX_REQUEST_DEADLINE,
+    PROFILING_ADMIN_TOKEN,
+    PROVIDER_ENCODING_PROFILES,
+    SUPPORTED_PROVIDERS,
+    SYSTEM_PROMPT,
+    setup_logging,
+)
+from deadline import Deadline, DeadlineExceeded, RequestCancelled, cancellation_stats
+from fastapi import FastAPI, File, Form, Header, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
+from image_processor import ImageProcessor, image_features
 from ocr_agent import create_ocr_agent
+from profiling import profiling_controller
+from routing import latency_model
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 
 # Initialize logger for this module
@@ -38,6 +59,183 @@ def create_response(success: bool, data: Dict = None, error: Dict = None) -> Dic
     return response
 
 
+def validate_ocr_params(
+    request_id: str, provider: str, api_key: Optional[str], encoding: Optional[str]
+) -> None:
+    """Validate OCR parameters before the request body is processed."""
+    if provider not in SUPPORTED_PROVIDERS:
+        logger.error(f"[Request {request_id}] Unsupported provider: {provider}")
+        raise HTTPException(status_code=400, detail=f"Unsupported provider: {provider}")
+
+    if provider == "together" and not api_key:
+        logger.error(f"[Request {request_id}] Missing API key for Together AI")
+        raise HTTPException(status_code=400, detail="API key required for Together AI")
+
+    if encoding and encoding != "auto" and encoding not in ENCODING_PROFILES:
+        logger.error(f"[Request {request_id}] Unsupported encoding: {encoding}")
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported encoding profile: {encoding}"
+        )
+
+
+def create_deadline(request_id: str, seconds: Optional[float]) -> Deadline:
+    """Create the request deadline, applying the server default and maximum."""
+    if seconds is not None and seconds <= 0:
+        logger.error(f"[Request {request_id}] Invalid deadline: {seconds}")
+        raise HTTPException(status_code=400, detail="Deadline must be positive")
+    seconds = min(seconds or DEFAULT_REQUEST_DEADLINE, MAX_REQUEST_DEADLINE)
+    logger.info(f"[Request {request_id}] Deadline: {seconds:.1f}s")
+    return Deadline(seconds)
+
+
+def run_ocr(
+    request_id: str,
+    content: bytes,
+    provider: str,
+    api_key: Optional[str],
+    hedge: bool,
+    encoding: Optional[str],
+    deadline: Deadline,
+) -> JSONResponse:
+    """
+    Preprocess image content, extract its text and build the success response.
+
+    The "auto" provider is routed first, so that the default encoding profile
+    and the recorded inference stats are those of the provider actually used.
+    """
+    features = image_features(content)
+    if provider == "auto":
+        provider = latency_model.choose_provider(features, api_key)
+        logger.info(f"[Request {request_id}] Routed to provider: {provider}")
+    encoding = encoding or PROVIDER_ENCODING_PROFILES.get(
+        provider, DEFAULT_ENCODING_PROFILE
+    )
+
+    # Process image using ImageProcessor
+    logger.info(f"[Request {request_id}] Processing image ({encoding})...")
+    deadline.check("preprocessing")
+    processed_image, mime_type, encoding = image_processor.process_image_with_profile(
+        content, encoding, deadline
+    )
+    base64_image = base64.b64encode(processed_image).decode("utf-8")
+    logger.info(f"[Request {request_id}] Image processed successfully")
+
+    # Initialize OCR agent and extract text
+    logger.info(
+        f"[Request {request_id}] Initializing OCR agent with provider: {provider}"
+    )
+    deadline.check("agent initialization")
+    ocr_agent = create_ocr_agent(
+        provider=provider,
+        api_key=api_key,
+        hedge=hedge,
+        timeout=deadline.remaining(),
+        features=features,
+    )
+    deadline.on_cancel(ocr_agent.cancel)
+
+    logger.info(f"[Request {request_id}] Extracting text from image...")
+    deadline.check("text extraction")
+    start_time = time.perf_counter()
+    text = ocr_agent.extract_text(base64_image, mime_type)
+    image_processor.stats.record_inference(
+        provider, encoding, time.perf_counter() - start_time
+    )
+    logger.info(f"[Request {request_id}] Text extraction completed")
+
+    # Create success response
+    response = create_response(success=True, data={"text": text})
+    logger.info(f"[Request {request_id}] Request completed successfully")
+    return JSONResponse(content=response, headers={"X-Request-ID": request_id})
+
+
+def run_profiled_ocr(request_id: str, *args, **kwargs) -> JSONResponse:
+    """Run run_ocr under the sampling profiler, storing the result by request id."""
+    with profiling_controller.profile(request_id):
+        return run_ocr(request_id, *args, **kwargs)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Check an admin token against PROFILING_ADMIN_TOKEN."""
+    if not PROFILING_ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token, PROFILING_ADMIN_TOKEN)
+
+
+def should_profile(request: Request) -> bool:
+    """Profile if an admin asked for it via X-Profile or profiling is armed."""
+    if request.headers.get("X-Profile") and is_admin(
+        request.headers.get("X-Admin-Token")
+    ):
+        return True
+    return profiling_controller.claim()
+
+
+async def run_ocr_until_done(
+    request: Request, request_id: str, deadline: Deadline, *args
+) -> JSONResponse:
+    """
+    Run run_ocr in a worker thread, cancelling it when the deadline passes
+    or the client disconnects.
+    """
+    run = run_profiled_ocr if should_profile(request) else run_ocr
+    task = asyncio.ensure_future(run_in_threadpool(run, request_id, *args, deadline))
+    while not task.done():
+        await asyncio.wait(
+            {task}, timeout=min(DISCONNECT_POLL_INTERVAL, deadline.remaining())
+        )
+        if task.done():
+            break
+        if deadline.remaining() <= 0:
+            deadline.cancel("deadline_exceeded")
+            break
+        if await request.is_disconnected():
+            logger.info(f"[Request {request_id}] Client disconnected")
+            deadline.cancel("client_disconnected")
+            break
+
+    if not task.done():
+        # The worker thread stops at its next deadline check or when the
+        # cancelled provider call fails; its result is discarded.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        deadline.check("response")
+    try:
+        return task.result()
+    except DeadlineExceeded:
+        # A provider timeout can end the worker before the loop above sees
+        # the deadline pass; count it like any other deadline cancellation
+        deadline.cancel("deadline_exceeded")
+        raise
+
+
+def create_error_response(request_id: str, exc: Exception) -> JSONResponse:
+    """Log a failed request and build its error response."""
+    if isinstance(exc, DeadlineExceeded):
+        exc = HTTPException(status_code=504, detail=str(exc))
+    elif isinstance(exc, RequestCancelled):
+        exc = HTTPException(status_code=499, detail=str(exc))
+
+    if isinstance(exc, HTTPException):
+        logger.error(
+            f"[Request {request_id}] HTTP Exception: {exc.detail}", exc_info=True
+        )
+        response = create_response(
+            success=False,
+            error={"code": exc.status_code, "message": exc.detail},
+        )
+        return JSONResponse(
+            content=response,
+            status_code=exc.status_code,
+            headers={"X-Request-ID": request_id},
+        )
+
+    logger.error(f"[Request {request_id}] Unexpected error: {str(exc)}", exc_info=True)
+    response = create_response(success=False, error={"code": 500, "message": str(exc)})
+    return JSONResponse(
+        content=response, status_code=500, headers={"X-Request-ID": request_id}
+    )
+
+
 @app.post("/ocr", response_model=Dict)
 async def perform_ocr(
     request: Request,
@@ -45,66 +243,182 @@ async def perform_ocr(
     api_key: Optional[str] = Form(None),
     provider: str = Form(DEFAULT_PROVIDER),
     system_prompt: str = Form(SYSTEM_PROMPT),
+    hedge: bool = Form(HEDGE_ENABLED),
+    encoding: Optional[str] = Form(None),
+    deadline: Optional[float] = Form(None),
+    deadline_header: Optional[float] = Header(None, alias="X-Request-Deadline"),
 ) -> JSONResponse:
     """Process OCR request."""
     request_id = str(uuid.uuid4())[:8]  # Generate a short request ID for tracking
 
     try:
+        request_deadline = create_deadline(
+            request_id, deadline if deadline is not None else deadline_header
+        )
         logger.info(f"[Request {request_id}] New OCR request received")
         logger.info(f"[Request {request_id}] Provider: {provider}")
         logger.info(
             f"[Request {request_id}] File: {file.filename} ({file.content_type})"
         )
 
-        if provider not in SUPPORTED_PROVIDERS:
-            logger.error(f"[Request {request_id}] Unsupported provider: {provider}")
-            raise HTTPException(
-                status_code=400, detail=f"Unsupported provider: {provider}"
-            )
+        validate_ocr_params(request_id, provider, api_key, encoding)
+        content = await file.read()
+        return await run_ocr_until_done(
+            request,
+            request_id,
+            request_deadline,
+            content,
+            provider,
+            api_key,
+            hedge,
+            encoding,
+        )
 
-        if provider == "together" and not api_key:
-            logger.error(f"[Request {request_id}] Missing API key for Together AI")
-            raise HTTPException(
-                status_code=400, detail="API key required for Together AI"
-            )
+    except Exception as e:
+        return create_error_response(request_id, e)
 
-        # Process image using ImageProcessor
-        logger.info(f"[Request {request_id}] Processing image...")
-        content = await file.read()
-        processed_image, mime_type = image_processor.process_image(content)
-        base64_image = base64.b64encode(processed_image).decode("utf-8")
-        logger.info(f"[Request {request_id}] Image processed successfully")
 
-        # Initialize OCR agent and extract text
-        logger.info(
-            f"[Request {request_id}] Initializing OCR agent with provider: {provider}"
+@app.put("/ocr/raw", response_model=Dict)
+async def perform_ocr_raw(
+    request: Request,
+    provider: str = Query(DEFAULT_PROVIDER),
+    hedge: bool = Query(HEDGE_ENABLED),
+    encoding: Optional[str] = Query(None),
+    api_key: Optional[str] = Header(None, alias="X-API-Key"),
+    deadline: Optional[float] = Header(None, alias="X-Request-Deadline"),
+) -> JSONResponse:
+    """
+    Process an OCR request whose body is the raw image.
+
+    The body is read chunk by chunk into memory and handed straight to
+    preprocessing, skipping multipart parsing and temporary files.
+    """
+    request_id = str(uuid.uuid4())[:8]  # Generate a short request ID for tracking
+
+    try:
+        request_deadline = create_deadline(request_id, deadline)
+        logger.info(f"[Request {request_id}] New raw OCR request received")
+        logger.info(f"[Request {request_id}] Provider: {provider}")
+
+        validate_ocr_params(request_id, provider, api_key, encoding)
+
+        declared_length = request.headers.get("content-length", "")
+        if declared_length.isdigit() and int(declared_length) > MAX_RAW_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+
+        # Passed on as the bytearray itself; copying it to bytes would cost
+        # another pass over bodies of up to MAX_RAW_BODY_BYTES
+        content = bytearray()
+        async for chunk in request.stream():
+            content.extend(chunk)
+            if len(content) > MAX_RAW_BODY_BYTES:
+                raise HTTPException(status_code=413, detail="Image too large")
+        if not content:
+            raise HTTPException(status_code=400, detail="Empty request body")
+        logger.info(f"[Request {request_id}] Body: {len(content)} bytes")
+
+        return await run_ocr_until_done(
+            request,
+            request_id,
+            request_deadline,
+            content,
+            provider,
+            api_key,
+            hedge,
+            encoding,
         )
-        ocr_agent = create_ocr_agent(provider=provider, api_key=api_key)
 
-        logger.info(f"[Request {request_id}] Extracting text from image...")
-        text = ocr_agent.extract_text(base64_image)
-        logger.info(f"[Request {request_id}] Text extraction completed")
+    except Exception as e:
+        return create_error_response(request_id, e)
+
+
+@app.get("/stats/encoding", response_model=Dict)
+async def encoding_stats() -> JSONResponse:
+    """Report payload size and latency per encoding profile and provider."""
+    response = create_response(success=True, data=image_processor.stats.summary())
+    return JSONResponse(content=response)
 
-        # Create success response
-        response = create_response(success=True, data={"text": text})
-        logger.info(f"[Request {request_id}] Request completed successfully")
+
+@app.get("/stats/routing", response_model=Dict)
+async def routing_stats() -> JSONResponse:
+    """Report the latency model used to route "auto" requests."""
+    response = create_response(success=True, data=latency_model.summary())
+    return JSONResponse(content=response)
+
+
+@app.get("/stats/cancellations", response_model=Dict)
+async def cancellation_counts() -> JSONResponse:
+    """Report requests cancelled by deadline or client disconnect."""
+    response = create_response(success=True, data=cancellation_stats.summary())
+    return JSONResponse(content=response)
+
+
+def require_admin(token: Optional[str]) -> None:
+    """Reject admin requests without a valid X-Admin-Token."""
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/admin/profiling", response_model=Dict)
+async def profiling_status(
+    admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+) -> JSONResponse:
+    """Report the profiling state and the request ids with stored profiles."""
+    try:
+        require_admin(admin_token)
+        response = create_response(success=True, data=profiling_controller.status())
         return JSONResponse(content=response)
+    except Exception as e:
+        return create_error_response("admin", e)
 
-    except HTTPException as http_exc:
-        logger.error(
-            f"[Request {request_id}] HTTP Exception: {http_exc.detail}", exc_info=True
-        )
-        response = create_response(
-            success=False,
-            error={"code": http_exc.status_code, "message": http_exc.detail},
-        )
-        return JSONResponse(content=response, status_code=http_exc.status_code)
 
+@app.post("/admin/profiling", response_model=Dict)
+async def arm_profiling(
+    requests: int = Query(0, ge=0),
+    seconds: float = Query(0.0, ge=0),
+    admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+) -> JSONResponse:
+    """Profile the next `requests` OCR requests and/or those within `seconds`."""
+    try:
+        require_admin(admin_token)
+        if not requests and not seconds:
+            raise HTTPException(
+                status_code=400, detail="Set requests and/or seconds to profile"
+            )
+        profiling_controller.arm(requests=requests, seconds=seconds)
+        response = create_response(success=True, data=profiling_controller.status())
+        return JSONResponse(content=response)
     except Exception as e:
-        logger.error(
-            f"[Request {request_id}] Unexpected error: {str(e)}", exc_info=True
-        )
-        response = create_response(
-            success=False, error={"code": 500, "message": str(e)}
-        )
-        return JSONResponse(content=response, status_code=500)
+        return create_error_response("admin", e)
+
+
+@app.delete("/admin/profiling", response_model=Dict)
+async def disarm_profiling(
+    admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+) -> JSONResponse:
+    """Stop profiling new requests."""
+    try:
+        require_admin(admin_token)
+        profiling_controller.disarm()
+        response = create_response(success=True, data=profiling_controller.status())
+        return JSONResponse(content=response)
+    except Exception as e:
+        return create_error_response("admin", e)
+
+
+@app.get("/admin/profiling/{request_id}")
+async def get_profile(
+    request_id: str,
+    admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+):
+    """Return a request's profile as folded stacks for flame graph tools."""
+    try:
+        require_admin(admin_token)
+        folded = profiling_controller.get(request_id)
+        if folded is None:
+            raise HTTPException(
+                status_code=404, detail=f"No profile for request: {request_id}"
+            )
+        return PlainTextResponse(folded)
+    except Exception as e:
+        return create_error_response("admin", e)
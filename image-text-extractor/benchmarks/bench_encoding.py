@@ -0,0 +1,58 @@
+# benchmarks/bench_encoding.py
+
+"""
+Encoding-profile benchmark for OCR payloads.
+
+Encodes every image in images/ with each profile and reports payload size,
+encode latency and legibility against the grayscale source. Run from the
+image-text-extractor directory:
+
+    python benchmarks/bench_encoding.py
+"""
+
+import glob
+import os
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ENCODING_PROFILES  # noqa: E402
+from image_processor import EncodingStats, ImageProcessor, legibility  # noqa: E402
+from PIL import Image  # noqa: E402
+
+RUNS = 5
+
+
+def main():
+    processor = ImageProcessor(stats=EncodingStats())
+    image_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "images")
+    profiles = list(ENCODING_PROFILES) + ["auto"]
+
+    print(
+        f"{'image':<16}{'profile':<14}{'bytes':>9}{'encode (ms)':>13}{'legibility':>12}"
+    )
+    for path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        with open(path, "rb") as image_file:
+            content = image_file.read()
+        reference, _ = processor.process_image(content, "rgb_jpeg")
+        reference = np.asarray(Image.open(BytesIO(reference)).convert("L"))
+
+        for profile in profiles:
+            timings = []
+            for _ in range(RUNS):
+                start_time = time.perf_counter()
+                encoded, _ = processor.process_image(content, profile)
+                timings.append(time.perf_counter() - start_time)
+            decoded = np.asarray(Image.open(BytesIO(encoded)).convert("L"))
+            print(
+                f"{os.path.basename(path):<16}{profile:<14}{len(encoded):>9}"
+                f"{min(timings) * 1000:>13.1f}{legibility(reference, decoded):>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_import.py
+
+"""
+Import-time benchmark for the VisionOCR modules.
+
+Each module is imported in a fresh interpreter so that the measured time
+reflects a cold start. Run from the image-text-extractor directory:
+
+    python benchmarks/bench_import.py
+"""
+
+import os
+import subprocess
+import sys
+
+MODULES = ["config", "image_processor", "ocr_agent", "api"]
+PROVIDER_SDKS = ["ollama", "together"]
+RUNS = 5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {sdks!r} if name in sys.modules]
+print(f"{{elapsed:.6f}} {{','.join(loaded)}}")
+"""
+
+
+def measure_import(module: str) -> tuple:
+    """Return (best import time in seconds, provider SDKs loaded) for a module."""
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    loaded = ""
+    for _ in range(RUNS):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, sdks=PROVIDER_SDKS)],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ""
+    return min(timings), loaded
+
+
+def main() -> int:
+    """Print import times, returning 1 if any module loads a provider SDK."""
+    status = 0
+    print(f"{'module':<18}{'import (ms)':>12}  provider SDKs loaded")
+    for module in MODULES:
+        try:
+            elapsed, loaded = measure_import(module)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<18}{'failed':>12}  {e.stderr.strip().splitlines()[-1]}")
+            status = 1
+            continue
+        print(f"{module:<18}{elapsed * 1000:>12.1f}  {loaded or '-'}")
+        if loaded:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
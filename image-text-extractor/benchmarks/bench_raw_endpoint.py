@@ -0,0 +1,100 @@
+# benchmarks/bench_raw_endpoint.py
+
+"""
+Per-request overhead of the multipart /ocr endpoint versus PUT /ocr/raw.
+
+Preprocessing and the OCR agent are replaced with stubs so that only request
+parsing and response building are measured. The two paths are measured in
+alternating rounds and the median per-request time is reported. Run from the
+image-text-extractor directory:
+
+    python benchmarks/bench_raw_endpoint.py
+"""
+
+import logging
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import app  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from ocr_agent import BaseOcrAgent  # noqa: E402
+from PIL import Image  # noqa: E402
+
+REQUESTS = 200
+ROUNDS = 5
+IMAGE = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "images", "patreon.png"
+)
+
+
+class StubAgent(BaseOcrAgent):
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
+        return "stub"
+
+
+def stub_processed_image() -> bytes:
+    """A tiny JPEG returned in place of process_image output."""
+    output = BytesIO()
+    Image.new("RGB", (8, 8), (255, 255, 255)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def measure(send) -> float:
+    """Return the mean seconds per request for a request-sending callable."""
+    start_time = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = send()
+        assert response.status_code == 200, response.text
+    return (time.perf_counter() - start_time) / REQUESTS
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    with open(IMAGE, "rb") as image_file:
+        content = image_file.read()
+
+    client = TestClient(app)
+
+    def send_multipart():
+        return client.post(
+            "/ocr",
+            data={"provider": "ollama"},
+            files={"file": ("image.png", content, "image/png")},
+        )
+
+    def send_raw():
+        return client.put(
+            "/ocr/raw",
+            params={"provider": "ollama"},
+            content=content,
+            headers={"Content-Type": "image/png"},
+        )
+
+    processed = (stub_processed_image(), "image/jpeg", "rgb_jpeg")
+    multipart_rounds, raw_rounds = [], []
+    with patch("api.create_ocr_agent", return_value=StubAgent()), patch(
+        "api.image_processor.process_image_with_profile", return_value=processed
+    ):
+        for send in (send_multipart, send_raw):
+            for _ in range(10):
+                send()
+        for _ in range(ROUNDS):
+            multipart_rounds.append(measure(send_multipart))
+            raw_rounds.append(measure(send_raw))
+    multipart = statistics.median(multipart_rounds)
+    raw = statistics.median(raw_rounds)
+
+    print(f"image: {os.path.basename(IMAGE)} ({len(content)} bytes)")
+    print(f"multipart /ocr:  {multipart * 1000:8.2f} ms/request")
+    print(f"raw /ocr/raw:    {raw * 1000:8.2f} ms/request")
+    print(f"saved:           {(multipart - raw) * 1000:8.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
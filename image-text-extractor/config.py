@@ -38,6 +38,57 @@ def setup_logging():
 # Supported image types
 SUPPORTED_IMAGE_TYPES = [".png", ".jpg", ".jpeg", ".gif", ".webp"]
 
+# Request deadlines in seconds; clients may lower them per request
+DEFAULT_REQUEST_DEADLINE = 300.0
+MAX_REQUEST_DEADLINE = 600.0
+DISCONNECT_POLL_INTERVAL = 0.5  # Seconds between client disconnect checks
+
+# On-demand profiling; the admin endpoints are disabled unless a token is set
+PROFILING_ADMIN_TOKEN = os.environ.get("OCR_PROFILING_TOKEN")
+PROFILING_INTERVAL = 0.005  # Seconds between stack samples
+PROFILING_MAX_RESULTS = 50  # Profiles kept in memory, oldest dropped first
+
+# Maximum request body accepted by the raw-body OCR endpoint
+MAX_RAW_BODY_BYTES = 20 * 1024 * 1024
+
+# Image encoding profiles for OCR payloads.
+# "transform" is applied to the grayscale image before encoding: "contrast"
+# stretches intensities, "binarize" applies adaptive thresholding.
+ENCODING_PROFILES = {
+    "rgb_jpeg": {"mode": "RGB", "format": "JPEG", "quality": 85},
+    "gray_jpeg": {
+        "mode": "L",
+        "transform": "contrast",
+        "format": "JPEG",
+        "quality": 85,
+    },
+    "gray_webp": {
+        "mode": "L",
+        "transform": "contrast",
+        "format": "WEBP",
+        "quality": 80,
+    },
+    "palette_png": {
+        "mode": "P",
+        "transform": "contrast",
+        "format": "PNG",
+        "colors": 16,
+    },
+    "binary_png": {"mode": "1", "transform": "binarize", "format": "PNG"},
+}
+# "auto" encodes every candidate and keeps the smallest legible one
+AUTO_ENCODING_CANDIDATES = ["gray_jpeg", "gray_webp", "palette_png", "binary_png"]
+DEFAULT_ENCODING_PROFILE = "rgb_jpeg"
+# Per-provider default profile, chosen from the /stats/encoding numbers;
+# "auto" stays opt-in until its output is validated against OCR results
+PROVIDER_ENCODING_PROFILES = {"together": "rgb_jpeg", "ollama": "rgb_jpeg"}
+# Minimum structural similarity (SSIM) to the grayscale source for "auto"
+ENCODING_LEGIBILITY_THRESHOLD = 0.9
+ENCODING_SSIM_WINDOW = 7  # Odd window size for the SSIM comparison
+BINARIZE_BLOCK_SIZE = 25  # Odd window size for adaptive thresholding
+BINARIZE_OFFSET = 10  # Intensity below the local mean that counts as ink
+CONTRAST_PERCENTILES = (2, 98)  # Intensity range stretched to 0-255
+
 # Together AI model configuration
 TOGETHER_MODEL_NAME = "meta-llama/Llama-3.2-11B-Vision-Instruct-Turbo"
 # TOGETHER_MODEL_NAME = "meta-llama/Llama-Vision-Free"
@@ -47,10 +98,46 @@ OLLAMA_MODEL_NAME = "llama3.2-vision"  # Matches your local Ollama model name
 
 # Other configurations can be added here
 
-# Add these configurations
-SUPPORTED_PROVIDERS = ["together", "ollama"]
+# Provider registry: provider name -> "module:AgentClass".
+# Agent classes are resolved on first use and import their SDK lazily, so a
+# process only pays the import cost of the providers it actually calls.
+PROVIDER_REGISTRY = {
+    "together": "ocr_agent:TogetherOcrAgent",
+    "ollama": "ocr_agent:OllamaOcrAgent",
+}
+# "auto" routes each request to the provider with the lowest predicted latency
+SUPPORTED_PROVIDERS = list(PROVIDER_REGISTRY) + ["auto"]
 DEFAULT_PROVIDER = "ollama"
 
+# Automatic provider selection
+AUTO_PRIOR_LATENCY = {"ollama": 30.0, "together": 5.0}  # Seconds, before data
+AUTO_MIN_SAMPLES = 5  # Observations before the fitted model replaces the prior
+AUTO_FORGETTING_FACTOR = 0.98  # Weight kept by older observations per update
+# Cap on the RLS covariance trace; without it the forgetting factor inflates the
+# covariance while inputs repeat, and one outlier then swings the fit
+AUTO_MAX_COVARIANCE_TRACE = 3000.0
+AUTO_EXPLORATION_RATE = 0.05  # Fraction of auto requests sent to a random provider
+# Seconds added to a failed or timed-out call's elapsed time before it is fed to
+# the latency model, so a failing provider stops being the top pick
+AUTO_FAILURE_PENALTY = 60.0
+# Requests a provider serves concurrently; providers not listed never queue
+AUTO_PROVIDER_CONCURRENCY = {"ollama": 1}
+# Estimated USD cost per request: fixed part plus a part per megapixel sent
+PROVIDER_COSTS = {"together": {"per_request": 0.0001, "per_megapixel": 0.0012}}
+AUTO_COST_CEILING = 0.001  # Maximum estimated USD cost of an auto-routed request
+
+# Request hedging configuration
+HEDGE_ENABLED = False  # Default for the per-request "hedge" option
+HEDGE_PERCENTILE = 0.95  # Fire a hedge once the primary exceeds this latency percentile
+HEDGE_MIN_SAMPLES = 20  # Observations required before a provider is hedged
+HEDGE_WINDOW_SIZE = 200  # Recent latencies kept per provider
+HEDGE_BUDGET_RATIO = 0.1  # Hedged attempts allowed per primary request
+HEDGE_BUDGET_BURST = 10.0  # Maximum hedge tokens that can accumulate
+HEDGE_MAX_WORKERS = 8  # Threads shared by primary and hedged attempts
+# Provider used for the hedged attempt; providers without a distinct backup
+# are not hedged, so a slow local Ollama is never hedged onto itself
+HEDGE_BACKUP_PROVIDERS = {"ollama": "together"}
+
 # Default system prompt
 SYSTEM_PROMPT = """Extract meaningful text content from the image while following these rules:
 
@@ -0,0 +1,106 @@
+# deadline.py
+
+"""
+Per-request deadlines and cancellation for the OCR request path.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its deadline."""
+
+
+class RequestCancelled(Exception):
+    """Raised when work continues for a request that has been cancelled."""
+
+
+class CancellationStats:
+    """Counts cancelled requests per reason."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, reason: str) -> None:
+        """Count a cancellation."""
+        with self._lock:
+            self._counts[reason] += 1
+
+    def summary(self) -> Dict[str, int]:
+        """Return cancellation counts per reason."""
+        with self._lock:
+            return dict(self._counts)
+
+
+cancellation_stats = CancellationStats()
+
+
+class Deadline:
+    """
+    Deadline and cancellation token shared by every stage of a request.
+
+    Stages call check() between units of work and register on_cancel()
+    callbacks to abort in-flight calls when the request is cancelled.
+    """
+
+    def __init__(self, seconds: float, stats: CancellationStats = cancellation_stats):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.stats = stats
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Register a callback run on cancellation, or run it now if already cancelled."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason: str) -> None:
+        """Cancel the request once, counting it and running registered callbacks."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        self.stats.record(reason)
+        logger.info(f"Request cancelled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error running cancellation callback: {str(e)}")
+
+    def check(self, stage: str) -> None:
+        """
+        Raise if the request was cancelled or its deadline has passed.
+
+        Args:
+            stage (str): Name of the stage about to run, for error messages.
+        """
+        if self.reason is None and self.remaining() <= 0:
+            self.cancel("deadline_exceeded")
+        if self.reason == "deadline_exceeded":
+            raise DeadlineExceeded(
+                f"Request deadline of {self.seconds:.1f}s exceeded before {stage}"
+            )
+        if self.reason is not None:
+            raise RequestCancelled(f"Request cancelled ({self.reason}) before {stage}")
@@ -0,0 +1,209 @@
+# hedging.py
+
+"""
+Request hedging for OCR agents to cut tail latency on slow provider calls.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Optional
+
+from config import (
+    HEDGE_BUDGET_BURST,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_MAX_WORKERS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    HEDGE_WINDOW_SIZE,
+)
+from deadline import DeadlineExceeded
+from ocr_agent import BaseOcrAgent
+from profiling import sample_current_thread
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="ocr-hedge"
+)
+
+
+class LatencyTracker:
+    """Tracks recent extract_text latencies per provider."""
+
+    def __init__(self, window_size: int = HEDGE_WINDOW_SIZE):
+        self.window_size = window_size
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float) -> None:
+        """Record an observed latency for a provider."""
+        with self._lock:
+            samples = self._samples.setdefault(provider, deque(maxlen=self.window_size))
+            samples.append(seconds)
+
+    def percentile(
+        self, provider: str, q: float, min_samples: int = HEDGE_MIN_SAMPLES
+    ) -> Optional[float]:
+        """
+        Return the q-th latency percentile for a provider.
+
+        Args:
+            provider (str): Provider name.
+            q (float): Percentile in the range [0, 1].
+            min_samples (int): Observations required for an estimate.
+
+        Returns:
+            Optional[float]: Latency in seconds, or None if there is not enough data.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(int(q * len(samples)), len(samples) - 1)
+        return samples[index]
+
+
+class HedgeBudget:
+    """Token bucket capping hedged attempts to a fraction of requests."""
+
+    def __init__(
+        self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST
+    ):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        """Credit the bucket for a primary request."""
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def try_acquire(self) -> bool:
+        """Spend one token for a hedged attempt if the budget allows it."""
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+class HedgedOcrAgent(BaseOcrAgent):
+    """
+    OCR agent that hedges slow calls with a second attempt.
+
+    Until the provider has a tracked latency percentile no hedge can fire, so
+    the primary runs on the calling thread. Otherwise it runs on the hedge
+    executor; if it has not returned by that percentile and the hedge budget
+    allows it, a backup attempt is started and the first successful result
+    wins. A queued losing attempt is cancelled; a running one is aborted
+    through its agent's cancel(), which providers without support ignore.
+
+    Latencies are recorded by the provider agents on every call (see
+    routing.ObservedOcrAgent), not only for hedged requests.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        primary: BaseOcrAgent,
+        backup_provider: str,
+        backup_factory: Callable[[], BaseOcrAgent],
+        tracker: LatencyTracker = latency_tracker,
+        budget: HedgeBudget = hedge_budget,
+        percentile: float = HEDGE_PERCENTILE,
+        timeout: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.primary = primary
+        self.backup_provider = backup_provider
+        self.backup_factory = backup_factory
+        self.tracker = tracker
+        self.budget = budget
+        self.percentile = percentile
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+        self._backup: Optional[BaseOcrAgent] = None
+
+    def _run_primary(
+        self, started: threading.Event, base64_image: str, mime_type: str
+    ) -> str:
+        started.set()
+        with sample_current_thread():
+            return self.primary.extract_text(base64_image, mime_type)
+
+    def _run_backup(self, base64_image: str, mime_type: str) -> str:
+        with sample_current_thread():
+            self._backup = self.backup_factory()
+            return self._backup.extract_text(base64_image, mime_type)
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        # Run in a copy of the caller's context so an active request profile
+        # also samples the executor thread
+        return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def cancel(self) -> None:
+        self.primary.cancel()
+        if self._backup is not None:
+            self._backup.cancel()
+
+    def _remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
+        self.budget.record_request()
+        hedge_delay = self.tracker.percentile(self.provider, self.percentile)
+        if hedge_delay is None:
+            return self.primary.extract_text(base64_image, mime_type)
+
+        started = threading.Event()
+        primary = self._submit(self._run_primary, started, base64_image, mime_type)
+
+        # Time the primary from when it starts running, not from when it was
+        # queued, so a busy executor does not make every primary look slow.
+        # Give up on a worker once the request timeout has passed.
+        if not started.wait(self._remaining()) and primary.cancel():
+            raise DeadlineExceeded(
+                f"No hedge worker became free within {self.timeout:.1f}s"
+            )
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done or not self.budget.try_acquire():
+            return primary.result()
+
+        logger.info(
+            f"Primary {self.provider} call exceeded {hedge_delay:.2f}s, "
+            f"hedging with {self.backup_provider}"
+        )
+        backup = self._submit(self._run_backup, base64_image, mime_type)
+        return self._first_success(primary, backup)
+
+    def _first_success(self, primary: Future, backup: Future) -> str:
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        if not loser.cancel():
+                            loser_agent = (
+                                self.primary if loser is primary else self._backup
+                            )
+                            if loser_agent is not None:
+                                loser_agent.cancel()
+                    winner = "primary" if future is primary else "hedged"
+                    logger.info(f"Hedged request won by {winner} attempt")
+                    return future.result()
+                error = error or future.exception()
+                logger.warning(f"Hedged attempt failed: {str(future.exception())}")
+        raise error
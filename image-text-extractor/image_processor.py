@@ -8,15 +8,213 @@ import base64
 import imghdr
 import logging
 import os
+import threading
+import time
+from collections import defaultdict
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
-from config import SUPPORTED_IMAGE_TYPES, setup_logging
+import numpy as np
+from config import (
+    AUTO_ENCODING_CANDIDATES,
+    BINARIZE_BLOCK_SIZE,
+    BINARIZE_OFFSET,
+    CONTRAST_PERCENTILES,
+    DEFAULT_ENCODING_PROFILE,
+    ENCODING_LEGIBILITY_THRESHOLD,
+    ENCODING_PROFILES,
+    ENCODING_SSIM_WINDOW,
+    SUPPORTED_IMAGE_TYPES,
+    setup_logging,
+)
+from deadline import Deadline
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_contrast(gray: np.ndarray) -> np.ndarray:
+    """
+    Stretch grayscale intensities so that the configured percentiles map to 0-255.
+
+    Args:
+        gray (np.ndarray): 2D uint8 grayscale image.
+
+    Returns:
+        np.ndarray: Contrast-normalized uint8 image.
+    """
+    low, high = np.percentile(gray, CONTRAST_PERCENTILES)
+    if high <= low:
+        return gray
+    stretched = (gray.astype(np.float32) - low) * (255.0 / (high - low))
+    return np.clip(stretched, 0, 255).astype(np.uint8)
+
+
+def box_mean(image: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    Mean over a square window around each pixel, computed with an integral image.
+
+    Args:
+        image (np.ndarray): 2D image.
+        block_size (int): Odd side length of the window.
+
+    Returns:
+        np.ndarray: float64 array of local means, same shape as the image.
+    """
+    pad = block_size // 2
+    padded = np.pad(image.astype(np.float64), pad, mode="edge")
+    integral = np.pad(padded.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    height, width = image.shape
+    window_sum = (
+        integral[block_size : block_size + height, block_size : block_size + width]
+        - integral[:height, block_size : block_size + width]
+        - integral[block_size : block_size + height, :width]
+        + integral[:height, :width]
+    )
+    return window_sum / (block_size * block_size)
+
+
+def adaptive_binarize(
+    gray: np.ndarray,
+    block_size: int = BINARIZE_BLOCK_SIZE,
+    offset: int = BINARIZE_OFFSET,
+) -> np.ndarray:
+    """
+    Binarize a grayscale image against its local mean.
+
+    Args:
+        gray (np.ndarray): 2D uint8 grayscale image.
+        block_size (int): Odd side length of the local window.
+        offset (int): Amount below the local mean for a pixel to count as ink.
+
+    Returns:
+        np.ndarray: uint8 image with ink at 0 and background at 255.
+    """
+    local_mean = box_mean(gray, block_size)
+    return np.where(gray > local_mean - offset, 255, 0).astype(np.uint8)
+
+
+def structural_similarity(
+    reference: np.ndarray, candidate: np.ndarray, window: int = ENCODING_SSIM_WINDOW
+) -> float:
+    """
+    Mean structural similarity (SSIM) of two grayscale images over box windows.
+
+    Args:
+        reference (np.ndarray): 2D uint8 grayscale image.
+        candidate (np.ndarray): 2D uint8 grayscale image of the same shape.
+        window (int): Odd side length of the comparison window.
+
+    Returns:
+        float: SSIM, 1.0 for identical images.
+    """
+    x = reference.astype(np.float64)
+    y = candidate.astype(np.float64)
+    mean_x, mean_y = box_mean(x, window), box_mean(y, window)
+    var_x = box_mean(x * x, window) - mean_x * mean_x
+    var_y = box_mean(y * y, window) - mean_y * mean_y
+    covariance = box_mean(x * y, window) - mean_x * mean_y
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim = ((2 * mean_x * mean_y + c1) * (2 * covariance + c2)) / (
+        (mean_x * mean_x + mean_y * mean_y + c1) * (var_x + var_y + c2)
+    )
+    return float(np.mean(ssim))
+
+
+def legibility(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """
+    Structural similarity of a decoded candidate to the grayscale source.
+
+    The candidate is compared with the source and with its contrast-normalized
+    version, so contrast stretching is not penalised, while thresholding and
+    compression artifacts that change stroke structure are.
+
+    Args:
+        reference (np.ndarray): 2D uint8 grayscale reference image.
+        candidate (np.ndarray): 2D uint8 grayscale decoded candidate.
+
+    Returns:
+        float: Best SSIM against either reference, 1.0 when identical.
+    """
+    return max(
+        structural_similarity(reference, candidate),
+        structural_similarity(normalize_contrast(reference), candidate),
+    )
+
+
+def resized_dimensions(width: int, height: int, max_size: int = 512) -> Tuple[int, int]:
+    """Dimensions process_image resizes an image to, keeping its aspect ratio."""
+    if width <= max_size and height <= max_size:
+        return width, height
+    ratio = min(max_size / width, max_size / height)
+    return int(width * ratio), int(height * ratio)
+
+
+def image_features(content: bytes) -> Dict[str, float]:
+    """
+    Features of an uploaded image used to predict provider latency.
+
+    Computed before process_image, since the provider has to be chosen before
+    its encoding profile is known. Only the image header is decoded.
+
+    Args:
+        content (bytes): Uploaded image content.
+
+    Returns:
+        Dict[str, float]: Pixel count after resizing and upload size in bytes.
+    """
+    width, height = resized_dimensions(*Image.open(BytesIO(content)).size)
+    return {"pixels": float(width * height), "bytes": float(len(content))}
+
+
+class EncodingStats:
+    """
+    Running payload size and latency statistics per encoding profile.
+    """
+
+    def __init__(self):
+        self._encodings = defaultdict(lambda: {"count": 0, "bytes": 0, "seconds": 0.0})
+        self._inferences = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        self._lock = threading.Lock()
+
+    def record_encoding(self, profile: str, size: int, seconds: float) -> None:
+        """Record the output size and encode time of a processed image."""
+        with self._lock:
+            entry = self._encodings[profile]
+            entry["count"] += 1
+            entry["bytes"] += size
+            entry["seconds"] += seconds
+
+    def record_inference(self, provider: str, profile: str, seconds: float) -> None:
+        """Record the extract_text latency of a provider for an encoding profile."""
+        with self._lock:
+            entry = self._inferences[(provider, profile)]
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def summary(self) -> Dict:
+        """Return average size and latency per profile and per provider."""
+        with self._lock:
+            profiles = {
+                profile: {
+                    "count": entry["count"],
+                    "avg_bytes": entry["bytes"] / entry["count"],
+                    "avg_encode_ms": entry["seconds"] * 1000 / entry["count"],
+                }
+                for profile, entry in self._encodings.items()
+            }
+            providers = {}
+            for (provider, profile), entry in self._inferences.items():
+                providers.setdefault(provider, {})[profile] = {
+                    "count": entry["count"],
+                    "avg_latency_ms": entry["seconds"] * 1000 / entry["count"],
+                }
+        return {"profiles": profiles, "providers": providers}
+
+
+encoding_stats = EncodingStats()
+
+
 class ImageProcessor:
     """
     Class responsible for handling image validation and encoding.
@@ -24,6 +222,9 @@ class ImageProcessor:
 
     MAX_IMAGE_SIZE = (1024, 1024)  # Maximum dimensions for processed images
 
+    def __init__(self, stats: EncodingStats = encoding_stats):
+        self.stats = stats
+
     def validate_image(self, image_path: str) -> bool:
         """
         Validate if the image exists and is of a supported type.
@@ -86,9 +287,107 @@ class ImageProcessor:
             logging.error(f"Error encoding image: {str(e)}")
             raise
 
-    def process_image(self, content: bytes) -> Tuple[bytes, str]:
+    def encode_profile(self, image: Image.Image, profile: str) -> Tuple[bytes, str]:
+        """
+        Encode an RGB image with a named encoding profile.
+
+        Args:
+            image (Image.Image): RGB image, already resized.
+            profile (str): Key of ENCODING_PROFILES.
+
+        Returns:
+            Tuple[bytes, str]: Encoded image content and its MIME type.
+        """
+        settings = ENCODING_PROFILES[profile]
+        if settings["mode"] != "RGB":
+            gray = np.asarray(image.convert("L"))
+            transform = settings.get("transform")
+            if transform == "contrast":
+                gray = normalize_contrast(gray)
+            elif transform == "binarize":
+                gray = adaptive_binarize(normalize_contrast(gray))
+            image = Image.fromarray(gray, mode="L")
+            if settings["mode"] == "P":
+                image = image.quantize(colors=settings["colors"])
+            elif settings["mode"] == "1":
+                image = image.convert("1", dither=Image.Dither.NONE)
+
+        output = BytesIO()
+        if settings["format"] == "PNG":
+            image.save(output, format="PNG", optimize=True)
+        else:
+            image.save(
+                output,
+                format=settings["format"],
+                quality=settings["quality"],
+                optimize=True,
+            )
+        return output.getvalue(), f"image/{settings['format'].lower()}"
+
+    def encode_smallest_legible(
+        self, image: Image.Image, deadline: Optional[Deadline] = None
+    ) -> Tuple[bytes, str, str]:
+        """
+        Encode with every auto candidate and keep the smallest legible result.
+
+        Args:
+            image (Image.Image): RGB image, already resized.
+            deadline (Optional[Deadline]): Request deadline checked between candidates.
+
+        Returns:
+            Tuple[bytes, str, str]: Encoded image content, its MIME type and the
+                profile that produced it.
+        """
+        reference = np.asarray(image.convert("L"))
+        best = None
+        for profile in AUTO_ENCODING_CANDIDATES:
+            if deadline is not None:
+                deadline.check(f"{profile} encoding")
+            encoded, mime_type = self.encode_profile(image, profile)
+            if best is not None and len(encoded) >= len(best[0]):
+                continue
+            decoded = np.asarray(Image.open(BytesIO(encoded)).convert("L"))
+            score = legibility(reference, decoded)
+            if score >= ENCODING_LEGIBILITY_THRESHOLD:
+                best = (encoded, mime_type, profile)
+            else:
+                logging.info(f"Encoding {profile} rejected: legibility {score:.3f}")
+
+        if best is None:
+            encoded, mime_type = self.encode_profile(image, DEFAULT_ENCODING_PROFILE)
+            return encoded, mime_type, DEFAULT_ENCODING_PROFILE
+        logging.info(f"Auto encoding selected {best[2]} ({len(best[0])} bytes)")
+        return best
+
+    def process_image(
+        self,
+        content: bytes,
+        profile: str = DEFAULT_ENCODING_PROFILE,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[bytes, str]:
         """Process the image content."""
+        processed_content, mime_type, _ = self.process_image_with_profile(
+            content, profile, deadline
+        )
+        return processed_content, mime_type
+
+    def process_image_with_profile(
+        self,
+        content: bytes,
+        profile: str = DEFAULT_ENCODING_PROFILE,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[bytes, str, str]:
+        """
+        Process the image content, also returning the encoding profile used.
+
+        For the "auto" profile this is the candidate that was selected, and
+        encoding stats are recorded under it.
+        """
         try:
+            if profile != "auto" and profile not in ENCODING_PROFILES:
+                raise ValueError(f"Unsupported encoding profile: {profile}")
+            start_time = time.perf_counter()
+
             # Open the image
             image = Image.open(BytesIO(content))
 
@@ -101,22 +400,28 @@ class ImageProcessor:
             logging.info(f"Original image dimensions: {width}x{height}")
 
             # Resize if larger than 512x512 (reduced from 1024x1024)
-            max_size = 512
-            if width > max_size or height > max_size:
-                ratio = min(max_size / width, max_size / height)
-                new_size = (int(width * ratio), int(height * ratio))
+            new_size = resized_dimensions(width, height)
+            if new_size != (width, height):
                 logging.info(f"Resizing image from ({width}, {height}) to {new_size}")
                 image = image.resize(new_size, Image.Resampling.LANCZOS)
 
-            # Save to bytes
-            output = BytesIO()
-            image.save(output, format="JPEG", quality=85, optimize=True)
-            processed_content = output.getvalue()
+            # Encode with the requested profile
+            if deadline is not None:
+                deadline.check("encoding")
+            if profile == "auto":
+                processed_content, mime_type, profile = self.encode_smallest_legible(
+                    image, deadline
+                )
+            else:
+                processed_content, mime_type = self.encode_profile(image, profile)
+            self.stats.record_encoding(
+                profile, len(processed_content), time.perf_counter() - start_time
+            )
 
             logging.info(
                 f"Image processed: Original size: {len(content)}, New size: {len(processed_content)}"
             )
-            return processed_content, "image/jpeg"
+            return processed_content, mime_type, profile
 
         except Exception as e:
             logging.error(f"Error processing image: {str(e)}")
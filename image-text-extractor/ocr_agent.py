@@ -4,34 +4,81 @@
 Module for the OCR agent using Together AI API.
 """
 
+import asyncio
+import concurrent.futures
+import importlib
 import logging
 import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Optional, Type
 
-import ollama
-import requests
-from config import OLLAMA_MODEL_NAME, TOGETHER_MODEL_NAME
-from together import Together
+from config import (
+    HEDGE_BACKUP_PROVIDERS,
+    OLLAMA_MODEL_NAME,
+    PROVIDER_REGISTRY,
+    TOGETHER_MODEL_NAME,
+)
+from deadline import DeadlineExceeded, RequestCancelled
+
+_io_loop: Optional[asyncio.AbstractEventLoop] = None
+_io_loop_lock = threading.Lock()
+
+
+def provider_io_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop thread running cancellable provider calls.
+
+    Cancelling a call's future cancels its asyncio task, and httpx closes the
+    connection of a cancelled request, so the provider sees the disconnect.
+    """
+    global _io_loop
+    with _io_loop_lock:
+        if _io_loop is None:
+            _io_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_io_loop.run_forever, name="ocr-provider-io", daemon=True
+            ).start()
+        return _io_loop
 
 
 class BaseOcrAgent(ABC):
     """Base class for OCR agents."""
 
+    requires_api_key = False
+
     @abstractmethod
-    def extract_text(self, base64_image: str) -> str:
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
         """Extract text from base64 encoded image."""
         pass
 
+    def cancel(self) -> None:
+        """Abort in-flight provider calls; agents without support ignore it."""
+        pass
+
 
 class TogetherOcrAgent(BaseOcrAgent):
     """OCR agent that uses Together AI API."""
 
-    def __init__(self, api_key: str, model_name: str = TOGETHER_MODEL_NAME):
-        self.client = Together(api_key=api_key)
+    requires_api_key = True
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = TOGETHER_MODEL_NAME,
+        timeout: Optional[float] = None,
+    ):
+        try:
+            from together import Together
+        except ImportError:
+            raise ImportError("Please install together package: pip install together")
+
+        self.client = Together(api_key=api_key, timeout=timeout)
         self.model_name = model_name
 
-    def extract_text(self, base64_image: str) -> str:
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
+        from together.error import Timeout
+
         try:
             response = self.client.chat.completions.create(
                 model=self.model_name,
@@ -46,7 +93,7 @@ class TogetherOcrAgent(BaseOcrAgent):
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": f"data:{mime_type};base64,{base64_image}"
                                 },
                             },
                         ],
@@ -62,6 +109,9 @@ class TogetherOcrAgent(BaseOcrAgent):
                 return response.choices[0].message.content
             return ""
 
+        except Timeout as e:
+            logging.error(f"Together AI request timed out: {str(e)}")
+            raise DeadlineExceeded(f"Together AI request timed out: {str(e)}") from e
         except Exception as e:
             logging.error(f"Error extracting text from image: {str(e)}")
             raise
@@ -70,16 +120,38 @@ class TogetherOcrAgent(BaseOcrAgent):
 class OllamaOcrAgent(BaseOcrAgent):
     """OCR agent that uses local Ollama instance."""
 
-    def __init__(self, model_name: str = OLLAMA_MODEL_NAME):
+    # (host, model) pairs already checked (and pulled if missing) by this process
+    _ready_models = set()
+    # Async clients per host, used only on the provider I/O loop
+    _async_clients = {}
+    _async_clients_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str = OLLAMA_MODEL_NAME,
+        timeout: Optional[float] = None,
+        host: Optional[str] = None,
+    ):
         try:
+            import ollama
+
             self.model_name = model_name
-            self.client = ollama
+            self.timeout = timeout
+            self.host = host
+            self._futures = set()
+            self._cancelled = False
+            self._lock = threading.Lock()
+
+            if (host, self.model_name) in OllamaOcrAgent._ready_models:
+                return
 
             logging.info(f"Initializing Ollama agent with model: {self.model_name}")
+            # Only needed for this one-time check; requests use the async client
+            client = ollama.Client(host=host, timeout=timeout)
 
             # Check if model exists and is responding
             try:
-                models = self.client.list()
+                models = client.list()
                 model_exists = any(
                     str(model).split(":")[0] == self.model_name.split(":")[0]
                     for model in models.models
@@ -89,14 +161,14 @@ class OllamaOcrAgent(BaseOcrAgent):
                     logging.info(
                         f"Model {self.model_name} not found locally. Pulling from repository..."
                     )
-                    self.client.pull(self.model_name)
+                    client.pull(self.model_name)
                     logging.info(f"Successfully pulled model {self.model_name}")
                 else:
                     logging.info(f"Model {self.model_name} found locally")
 
                 # Test model with a simple prompt
                 logging.info("Testing model responsiveness...")
-                test_response = self.client.generate(
+                test_response = client.generate(
                     model=self.model_name,
                     prompt="Test prompt",
                     options={
@@ -106,6 +178,7 @@ class OllamaOcrAgent(BaseOcrAgent):
                 )
                 if test_response:
                     logging.info("Model is responsive")
+                OllamaOcrAgent._ready_models.add((host, self.model_name))
 
             except Exception as e:
                 logging.error(f"Error during model initialization: {str(e)}")
@@ -117,9 +190,10 @@ class OllamaOcrAgent(BaseOcrAgent):
             logging.error(f"Error initializing Ollama agent: {str(e)}")
             raise
 
-    def extract_text(self, base64_image: str) -> str:
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
         try:
             import base64
+            import mimetypes
             import tempfile
             import time
 
@@ -127,7 +201,8 @@ class OllamaOcrAgent(BaseOcrAgent):
             start_time = time.time()
 
             # Convert base64 to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
+            suffix = mimetypes.guess_extension(mime_type) or ".jpg"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
                 temp_file.write(base64.b64decode(base64_image))
                 temp_path = temp_file.name
                 logging.info(f"Temporary file created at: {temp_path}")
@@ -136,7 +211,7 @@ class OllamaOcrAgent(BaseOcrAgent):
                 logging.info("Sending request to Ollama model...")
 
                 # Use chat instead of generate for vision models
-                response = self.client.chat(
+                response = self._chat(
                     model=self.model_name,
                     messages=[
                         {
@@ -185,14 +260,106 @@ class OllamaOcrAgent(BaseOcrAgent):
             logging.error(f"Error extracting text from image using Ollama: {str(e)}")
             raise
 
+    def _chat(self, **kwargs):
+        """Run an async chat call on the provider I/O loop so it can be cancelled."""
+        import ollama
+
+        with OllamaOcrAgent._async_clients_lock:
+            client = OllamaOcrAgent._async_clients.get(self.host)
+            if client is None:
+                client = ollama.AsyncClient(host=self.host)
+                OllamaOcrAgent._async_clients[self.host] = client
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(client.chat(**kwargs), self.timeout), provider_io_loop()
+        )
+        with self._lock:
+            self._futures.add(future)
+            if self._cancelled:
+                future.cancel()
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise RequestCancelled("Ollama request cancelled")
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(
+                f"Ollama request exceeded its {self.timeout:.1f}s timeout"
+            ) from e
+        finally:
+            with self._lock:
+                self._futures.discard(future)
+
+    def cancel(self) -> None:
+        # Cancelling the task closes its HTTP connection, which makes Ollama
+        # stop generating for this request
+        logging.info("Cancelling in-flight Ollama request")
+        with self._lock:
+            self._cancelled = True
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+
+def load_agent_class(provider: str) -> Type[BaseOcrAgent]:
+    """Resolve the agent class registered for a provider in PROVIDER_REGISTRY."""
+    if provider not in PROVIDER_REGISTRY:
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    module_name, class_name = PROVIDER_REGISTRY[provider].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
 
-def create_ocr_agent(provider: str, api_key: Optional[str] = None) -> BaseOcrAgent:
-    """Factory function to create appropriate OCR agent."""
-    if provider == "together":
+
+def create_ocr_agent(
+    provider: str,
+    api_key: Optional[str] = None,
+    hedge: bool = False,
+    timeout: Optional[float] = None,
+    features: Optional[Dict[str, float]] = None,
+) -> BaseOcrAgent:
+    """
+    Factory function to create appropriate OCR agent.
+
+    The "auto" provider is resolved by the latency model from the image
+    features of process_image. Every provider agent reports its calls to that
+    model and to the hedging latency tracker.
+    """
+    from routing import ObservedOcrAgent, latency_model
+
+    if provider == "auto":
+        provider = latency_model.choose_provider(features, api_key)
+
+    agent_class = load_agent_class(provider)
+    if agent_class.requires_api_key:
         if not api_key:
             raise ValueError("API key required for Together AI")
-        return TogetherOcrAgent(api_key=api_key)
-    elif provider == "ollama":
-        return OllamaOcrAgent()
+        agent = agent_class(api_key=api_key, timeout=timeout)
     else:
-        raise ValueError(f"Unsupported provider: {provider}")
+        agent = agent_class(timeout=timeout)
+    agent = ObservedOcrAgent(provider, agent, features)
+
+    backup_provider = hedge_backup_provider(provider, api_key) if hedge else None
+    if backup_provider is None:
+        return agent
+
+    from hedging import HedgedOcrAgent
+
+    return HedgedOcrAgent(
+        provider=provider,
+        primary=agent,
+        backup_provider=backup_provider,
+        backup_factory=lambda: create_ocr_agent(
+            backup_provider, api_key=api_key, timeout=timeout, features=features
+        ),
+        timeout=timeout,
+    )
+
+
+def hedge_backup_provider(provider: str, api_key: Optional[str]) -> Optional[str]:
+    """Return the distinct, usable backup provider for hedging, if any."""
+    backup_provider = HEDGE_BACKUP_PROVIDERS.get(provider)
+    if backup_provider is None or backup_provider == provider:
+        logging.info(f"No backup provider configured for {provider}, not hedging")
+        return None
+    if load_agent_class(backup_provider).requires_api_key and not api_key:
+        logging.info(f"No API key for backup provider {backup_provider}, not hedging")
+        return None
+    return backup_provider
@@ -0,0 +1,201 @@
+# profiling.py
+
+"""
+On-demand sampling profiler for the OCR request path.
+
+Profiles are stored as folded stacks ("thread;frame;frame count" per line),
+the input format of flamegraph.pl, speedscope and similar tools. Besides the
+thread running the request, worker threads that run part of it (such as
+hedged agent calls) join the profile through sample_current_thread().
+Provider I/O on the shared event loop thread is not attributed to requests.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from config import PROFILING_INTERVAL, PROFILING_MAX_RESULTS
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Samples the call stacks of registered threads from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILING_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._threads: Dict[int, str] = {}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="ocr-profiler", daemon=True
+        )
+        self.add_thread(thread_id)
+
+    def add_thread(self, thread_id: int) -> None:
+        """Start sampling a thread."""
+        with self._threads_lock:
+            self._threads[thread_id] = _thread_name(thread_id)
+
+    def remove_thread(self, thread_id: int) -> None:
+        """Stop sampling a thread."""
+        with self._threads_lock:
+            self._threads.pop(thread_id, None)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                threads = dict(self._threads)
+            frames = sys._current_frames()
+            for thread_id, thread_name in threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_name)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Return the samples as folded stacks."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.items())
+
+
+def _thread_name(thread_id: int) -> str:
+    for thread in threading.enumerate():
+        if thread.ident == thread_id:
+            return thread.name
+    return f"thread-{thread_id}"
+
+
+# Sampler of the request being profiled in the current context, if any
+_active_sampler: ContextVar[Optional[StackSampler]] = ContextVar(
+    "active_sampler", default=None
+)
+
+
+@contextmanager
+def sample_current_thread() -> Iterator[None]:
+    """
+    Include the calling thread in the active request profile, if any.
+
+    Work submitted to other threads must run in a copy of the submitting
+    context (contextvars.copy_context().run) for the profile to be found.
+    """
+    sampler = _active_sampler.get()
+    if sampler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.add_thread(thread_id)
+    try:
+        yield
+    finally:
+        sampler.remove_thread(thread_id)
+
+
+class ProfilingController:
+    """
+    Decides which requests are profiled and keeps their results.
+
+    Profiling is armed for the next N requests and/or a time window. While
+    disarmed, claim() is a pair of attribute reads with no locking.
+    """
+
+    def __init__(
+        self,
+        max_results: int = PROFILING_MAX_RESULTS,
+        interval: float = PROFILING_INTERVAL,
+    ):
+        self.max_results = max_results
+        self.interval = interval
+        self._remaining = 0
+        self._until = 0.0
+        self._results: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def arm(self, requests: int = 0, seconds: float = 0.0) -> None:
+        """Profile the next `requests` requests and/or those within `seconds`."""
+        with self._lock:
+            self._remaining = max(requests, 0)
+            self._until = time.monotonic() + seconds if seconds > 0 else 0.0
+        logger.info(f"Profiling armed: requests={requests}, seconds={seconds}")
+
+    def disarm(self) -> None:
+        with self._lock:
+            self._remaining = 0
+            self._until = 0.0
+        logger.info("Profiling disarmed")
+
+    def claim(self) -> bool:
+        """Return True if the current request should be profiled."""
+        if not self._remaining and not self._until:
+            return False
+        with self._lock:
+            if self._until and time.monotonic() < self._until:
+                return True
+            self._until = 0.0
+            if self._remaining > 0:
+                self._remaining -= 1
+                return True
+            return False
+
+    @contextmanager
+    def profile(self, request_id: str) -> Iterator[None]:
+        """Sample the calling thread, and threads joining it, during the block."""
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        token = _active_sampler.set(sampler)
+        sampler.start()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            _active_sampler.reset(token)
+            elapsed = time.perf_counter() - start_time
+            self._store(request_id, sampler.folded())
+            logger.info(
+                f"[Request {request_id}] Profiled {sum(sampler.samples.values())} "
+                f"samples over {elapsed:.2f}s"
+            )
+
+    def _store(self, request_id: str, folded: str) -> None:
+        with self._lock:
+            self._results[request_id] = folded
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[str]:
+        """Return the folded stacks recorded for a request, if any."""
+        with self._lock:
+            return self._results.get(request_id)
+
+    def status(self) -> Dict:
+        """Return the armed state and the ids of stored profiles."""
+        with self._lock:
+            return {
+                "remaining_requests": self._remaining,
+                "remaining_seconds": max(self._until - time.monotonic(), 0.0),
+                "profiles": list(self._results),
+            }
+
+
+profiling_controller = ProfilingController()
@@ -0,0 +1,247 @@
+# routing.py
+
+"""
+Latency-model-driven provider selection for the "auto" provider.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from config import (
+    AUTO_COST_CEILING,
+    AUTO_EXPLORATION_RATE,
+    AUTO_FAILURE_PENALTY,
+    AUTO_FORGETTING_FACTOR,
+    AUTO_MAX_COVARIANCE_TRACE,
+    AUTO_MIN_SAMPLES,
+    AUTO_PRIOR_LATENCY,
+    AUTO_PROVIDER_CONCURRENCY,
+    PROVIDER_COSTS,
+    PROVIDER_REGISTRY,
+)
+from deadline import RequestCancelled
+from hedging import LatencyTracker, latency_tracker
+from ocr_agent import BaseOcrAgent, load_agent_class
+
+logger = logging.getLogger(__name__)
+
+
+def feature_vector(features: Optional[Dict[str, float]]) -> np.ndarray:
+    """Regression inputs: intercept, megapixels and payload megabytes."""
+    features = features or {}
+    return np.array(
+        [
+            1.0,
+            features.get("pixels", 0) / 1e6,
+            features.get("bytes", 0) / 1e6,
+        ]
+    )
+
+
+class ProviderModel:
+    """
+    Recursive least squares fit of extract_text latency against image features.
+
+    The forgetting factor down-weights old observations so the model follows
+    drift in provider latency. Dividing by it every update grows the covariance
+    in directions the inputs no longer excite (e.g. a run of same-sized images),
+    so its trace is rescaled to stay within max_covariance_trace.
+    """
+
+    def __init__(
+        self,
+        prior_latency: float,
+        forgetting_factor: float = AUTO_FORGETTING_FACTOR,
+        max_covariance_trace: float = AUTO_MAX_COVARIANCE_TRACE,
+    ):
+        self.prior_latency = prior_latency
+        self.forgetting_factor = forgetting_factor
+        self.max_covariance_trace = max_covariance_trace
+        self.theta = np.array([prior_latency, 0.0, 0.0])
+        self.covariance = np.eye(3) * 1000.0
+        self.samples = 0
+
+    def observe(self, x: np.ndarray, seconds: float) -> None:
+        """Update the fit with one observed latency."""
+        px = self.covariance @ x
+        gain = px / (self.forgetting_factor + x @ px)
+        self.theta = self.theta + gain * (seconds - x @ self.theta)
+        self.covariance = (
+            self.covariance - np.outer(gain, px)
+        ) / self.forgetting_factor
+        trace = float(np.trace(self.covariance))
+        if trace > self.max_covariance_trace:
+            self.covariance *= self.max_covariance_trace / trace
+        self.samples += 1
+
+    def predict(self, x: np.ndarray) -> float:
+        """Predicted latency in seconds, falling back to the prior until fitted."""
+        if self.samples < AUTO_MIN_SAMPLES:
+            return self.prior_latency
+        return max(float(x @ self.theta), 0.0)
+
+
+class LatencyModel:
+    """Per-provider latency and cost model used to route "auto" requests."""
+
+    def __init__(self, exploration_rate: float = AUTO_EXPLORATION_RATE):
+        self.exploration_rate = exploration_rate
+        self._models = {
+            provider: ProviderModel(AUTO_PRIOR_LATENCY.get(provider, 10.0))
+            for provider in PROVIDER_REGISTRY
+        }
+        self._in_flight = Counter()
+        self._lock = threading.Lock()
+
+    def begin(self, provider: str) -> None:
+        """Count a request as in flight on a provider."""
+        with self._lock:
+            self._in_flight[provider] += 1
+
+    def end(self, provider: str) -> None:
+        with self._lock:
+            self._in_flight[provider] -= 1
+
+    def observe(
+        self, provider: str, features: Optional[Dict[str, float]], seconds: float
+    ) -> None:
+        """Feed an observed extract_text latency into the provider's model."""
+        with self._lock:
+            self._models[provider].observe(feature_vector(features), seconds)
+
+    def predict_completion(
+        self, provider: str, features: Optional[Dict[str, float]]
+    ) -> float:
+        """
+        Predicted seconds until a new request on a provider completes.
+
+        Requests beyond the provider's concurrency wait for those ahead of them.
+        """
+        with self._lock:
+            latency = self._models[provider].predict(feature_vector(features))
+            in_flight = self._in_flight[provider]
+        concurrency = AUTO_PROVIDER_CONCURRENCY.get(provider)
+        if concurrency is None:
+            return latency
+        return latency * (1 + in_flight // concurrency)
+
+    def estimate_cost(
+        self, provider: str, features: Optional[Dict[str, float]]
+    ) -> float:
+        """Estimated USD cost of sending the image to a provider."""
+        costs = PROVIDER_COSTS.get(provider)
+        if costs is None:
+            return 0.0
+        megapixels = feature_vector(features)[1]
+        return costs["per_request"] + costs["per_megapixel"] * megapixels
+
+    def eligible_providers(
+        self, features: Optional[Dict[str, float]], api_key: Optional[str]
+    ) -> List[str]:
+        """Providers usable with the given credentials and within the cost ceiling."""
+        return [
+            provider
+            for provider in PROVIDER_REGISTRY
+            if (api_key or not load_agent_class(provider).requires_api_key)
+            and self.estimate_cost(provider, features) <= AUTO_COST_CEILING
+        ]
+
+    def choose_provider(
+        self, features: Optional[Dict[str, float]], api_key: Optional[str]
+    ) -> str:
+        """
+        Pick the eligible provider with the lowest predicted completion time.
+
+        A small fraction of requests go to a random eligible provider so that
+        providers which are currently slower keep receiving observations.
+        """
+        providers = self.eligible_providers(features, api_key)
+        if not providers:
+            raise ValueError("No provider available within the cost ceiling")
+        if len(providers) > 1 and random.random() < self.exploration_rate:
+            provider = random.choice(providers)
+            logger.info(f"Auto provider exploring {provider}")
+            return provider
+
+        predictions = {p: self.predict_completion(p, features) for p in providers}
+        provider = min(predictions, key=predictions.get)
+        logger.info(
+            f"Auto provider selected {provider}: "
+            + ", ".join(f"{p}={t:.2f}s" for p, t in predictions.items())
+        )
+        return provider
+
+    def summary(self) -> Dict:
+        """Return samples, in-flight requests and fitted coefficients per provider."""
+        with self._lock:
+            return {
+                provider: {
+                    "samples": model.samples,
+                    "in_flight": self._in_flight[provider],
+                    "coefficients": model.theta.round(4).tolist(),
+                }
+                for provider, model in self._models.items()
+            }
+
+
+latency_model = LatencyModel()
+
+
+class ObservedOcrAgent(BaseOcrAgent):
+    """
+    Agent wrapper that reports in-flight calls and latencies to the routing
+    model and the hedging latency tracker.
+
+    Failed calls reach the routing model as their elapsed time plus
+    AUTO_FAILURE_PENALTY; cancelled calls only reach the tracker.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        agent: BaseOcrAgent,
+        features: Optional[Dict[str, float]] = None,
+        model: LatencyModel = latency_model,
+        tracker: LatencyTracker = latency_tracker,
+    ):
+        self.provider = provider
+        self.agent = agent
+        self.features = features
+        self.model = model
+        self.tracker = tracker
+
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
+        self.model.begin(self.provider)
+        try:
+            start_time = time.perf_counter()
+            text = self.agent.extract_text(base64_image, mime_type)
+        except RequestCancelled:
+            # A cancelled call (e.g. the losing attempt of a hedge) took at
+            # least this long; dropping it would hide the slowest calls from
+            # the hedging percentile
+            self.tracker.record(self.provider, time.perf_counter() - start_time)
+            raise
+        except Exception:
+            # Failures and timeouts count as slow calls, otherwise a provider
+            # that keeps failing keeps its prior or old fit and stays the pick
+            if self.features is not None:
+                elapsed = time.perf_counter() - start_time
+                self.model.observe(
+                    self.provider, self.features, elapsed + AUTO_FAILURE_PENALTY
+                )
+            raise
+        finally:
+            self.model.end(self.provider)
+        elapsed = time.perf_counter() - start_time
+        self.tracker.record(self.provider, elapsed)
+        if self.features is not None:
+            self.model.observe(self.provider, self.features, elapsed)
+        return text
+
+    def cancel(self) -> None:
+        self.agent.cancel()
@@ -4,8 +4,10 @@
 Unit tests for api.py
 """
 
+import threading
 from unittest.mock import patch
 
+import api
 import pytest
 from api import app
 from fastapi.testclient import TestClient
@@ -45,3 +47,190 @@ def test_perform_ocr_unsupported_file_type(client):
         "data": None,
         "error": {"code": 400, "message": "Unsupported file type."},
     }
+
+
+def test_encoding_stats(client):
+    response = client.get("/stats/encoding")
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    assert set(response.json()["data"]) == {"profiles", "providers"}
+
+
+@pytest.fixture
+def png_image():
+    from io import BytesIO
+
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new("RGB", (64, 32), (255, 255, 255)).save(output, format="PNG")
+    return output.getvalue()
+
+
+@patch("api.create_ocr_agent")
+def test_perform_ocr_raw_success(mock_create_agent, client, png_image):
+    mock_create_agent.return_value.extract_text.return_value = "Extracted text"
+
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama", "encoding": "gray_jpeg"},
+        content=png_image,
+        headers={"Content-Type": "image/png"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "success": True,
+        "data": {"text": "Extracted text"},
+        "error": None,
+    }
+    mock_create_agent.return_value.extract_text.assert_called_once()
+
+
+@patch("api.create_ocr_agent")
+@patch("api.latency_model.choose_provider", return_value="together")
+def test_perform_ocr_raw_auto_routes_before_encoding(
+    mock_choose_provider, mock_create_agent, client, png_image
+):
+    mock_create_agent.return_value.extract_text.return_value = "Extracted text"
+
+    with patch.object(
+        api.image_processor,
+        "process_image_with_profile",
+        wraps=api.image_processor.process_image_with_profile,
+    ) as mock_process_image:
+        response = client.put(
+            "/ocr/raw",
+            params={"provider": "auto"},
+            content=png_image,
+            headers={"X-API-Key": "key"},
+        )
+    assert response.status_code == 200
+    mock_choose_provider.assert_called_once_with(
+        {"pixels": 64.0 * 32, "bytes": float(len(png_image))}, "key"
+    )
+    assert mock_process_image.call_args.args[1] == "rgb_jpeg"
+    assert mock_create_agent.call_args.kwargs["provider"] == "together"
+    providers = api.image_processor.stats.summary()["providers"]
+    assert "rgb_jpeg" in providers["together"]
+    assert "auto" not in providers
+
+
+def test_perform_ocr_raw_missing_api_key(client, png_image):
+    response = client.put(
+        "/ocr/raw", params={"provider": "together"}, content=png_image
+    )
+    assert response.status_code == 400
+    assert response.json()["error"] == {
+        "code": 400,
+        "message": "API key required for Together AI",
+    }
+
+
+@patch("api.MAX_RAW_BODY_BYTES", 16)
+@patch("api.Request.stream", side_effect=AssertionError("body was read"))
+def test_perform_ocr_raw_rejects_declared_oversized_body(
+    mock_stream, client, png_image
+):
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama"},
+        content=png_image,
+        headers={"Content-Length": str(len(png_image))},
+    )
+    assert response.status_code == 413
+    mock_stream.assert_not_called()
+
+
+def test_perform_ocr_raw_empty_body(client):
+    response = client.put("/ocr/raw", params={"provider": "ollama"}, content=b"")
+    assert response.status_code == 400
+    assert response.json()["error"]["message"] == "Empty request body"
+
+
+@patch("api.create_ocr_agent")
+def test_perform_ocr_raw_deadline_exceeded(mock_create_agent, client, png_image):
+    from deadline import cancellation_stats
+
+    release = threading.Event()
+    agent = mock_create_agent.return_value
+    agent.extract_text.side_effect = lambda *args: release.wait(timeout=5)
+    agent.cancel.side_effect = release.set
+    before = cancellation_stats.summary().get("deadline_exceeded", 0)
+
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama"},
+        content=png_image,
+        headers={"X-Request-Deadline": "0.2"},
+    )
+    assert response.status_code == 504
+    assert response.json()["success"] is False
+    agent.cancel.assert_called_once()
+    assert cancellation_stats.summary()["deadline_exceeded"] == before + 1
+
+
+@patch("api.create_ocr_agent")
+def test_perform_ocr_raw_provider_timeout(mock_create_agent, client, png_image):
+    from deadline import DeadlineExceeded, cancellation_stats
+
+    agent = mock_create_agent.return_value
+    agent.extract_text.side_effect = DeadlineExceeded("Ollama request timed out")
+    before = cancellation_stats.summary().get("deadline_exceeded", 0)
+
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama"},
+        content=png_image,
+        headers={"X-Request-Deadline": "30"},
+    )
+    assert response.status_code == 504
+    assert response.json()["error"]["message"] == "Ollama request timed out"
+    assert cancellation_stats.summary()["deadline_exceeded"] == before + 1
+
+
+def test_perform_ocr_zero_deadline_form_field(client, png_image):
+    response = client.post(
+        "/ocr",
+        data={"provider": "ollama", "deadline": "0"},
+        files={"file": ("test.png", png_image, "image/png")},
+    )
+    assert response.status_code == 400
+    assert response.json()["error"]["message"] == "Deadline must be positive"
+
+
+def test_perform_ocr_raw_invalid_deadline(client, png_image):
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama"},
+        content=png_image,
+        headers={"X-Request-Deadline": "-1"},
+    )
+    assert response.status_code == 400
+    assert response.json()["error"]["message"] == "Deadline must be positive"
+
+
+def test_admin_profiling_requires_token(client):
+    response = client.post("/admin/profiling", params={"requests": 1})
+    assert response.status_code == 403
+
+
+@patch("api.PROFILING_ADMIN_TOKEN", "secret")
+@patch("api.create_ocr_agent")
+def test_perform_ocr_raw_profiled(mock_create_agent, client, png_image):
+    mock_create_agent.return_value.extract_text.return_value = "Extracted text"
+
+    response = client.put(
+        "/ocr/raw",
+        params={"provider": "ollama"},
+        content=png_image,
+        headers={"X-Profile": "1", "X-Admin-Token": "secret"},
+    )
+    assert response.status_code == 200
+    request_id = response.headers["X-Request-ID"]
+
+    response = client.get(
+        f"/admin/profiling/{request_id}", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    status = client.get("/admin/profiling", headers={"X-Admin-Token": "secret"})
+    assert request_id in status.json()["data"]["profiles"]
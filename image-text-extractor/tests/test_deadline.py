@@ -0,0 +1,52 @@
+# tests/test_deadline.py
+
+"""
+Unit tests for deadline.py
+"""
+
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from deadline import CancellationStats, Deadline, DeadlineExceeded, RequestCancelled
+
+
+@pytest.fixture
+def stats():
+    return CancellationStats()
+
+
+def test_remaining_counts_down(stats):
+    deadline = Deadline(10, stats=stats)
+    assert 9 < deadline.remaining() <= 10
+    deadline.check("preprocessing")
+    assert stats.summary() == {}
+
+
+def test_check_after_expiry_raises_and_counts(stats):
+    deadline = Deadline(0.01, stats=stats)
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("preprocessing")
+    assert deadline.remaining() == 0.0
+    assert stats.summary() == {"deadline_exceeded": 1}
+
+
+def test_cancel_runs_callbacks_once(stats):
+    deadline = Deadline(10, stats=stats)
+    callback = MagicMock()
+    deadline.on_cancel(callback)
+    deadline.cancel("client_disconnected")
+    deadline.cancel("deadline_exceeded")
+    callback.assert_called_once()
+    assert stats.summary() == {"client_disconnected": 1}
+    with pytest.raises(RequestCancelled):
+        deadline.check("text extraction")
+
+
+def test_on_cancel_after_cancellation_runs_immediately(stats):
+    deadline = Deadline(10, stats=stats)
+    deadline.cancel("client_disconnected")
+    callback = MagicMock()
+    deadline.on_cancel(callback)
+    callback.assert_called_once()
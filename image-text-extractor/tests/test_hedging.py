@@ -0,0 +1,158 @@
+# tests/test_hedging.py
+
+"""
+Unit tests for hedging.py
+"""
+
+import threading
+
+import pytest
+from deadline import DeadlineExceeded
+from hedging import HedgeBudget, HedgedOcrAgent, LatencyTracker
+from ocr_agent import BaseOcrAgent
+
+
+class FakeAgent(BaseOcrAgent):
+    def __init__(self, text, release=None, error=None):
+        self.text = text
+        self.release = release
+        self.error = error
+        self.calls = 0
+        self.thread = None
+
+    def extract_text(self, base64_image: str, mime_type: str = "image/jpeg") -> str:
+        self.calls += 1
+        self.thread = threading.current_thread()
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+@pytest.fixture
+def tracker():
+    tracker = LatencyTracker(window_size=50)
+    for _ in range(50):
+        tracker.record("ollama", 0.01)
+    return tracker
+
+
+def make_agent(primary, backup, tracker, budget, timeout=None):
+    return HedgedOcrAgent(
+        provider="ollama",
+        primary=primary,
+        backup_provider="together",
+        backup_factory=lambda: backup,
+        tracker=tracker,
+        budget=budget,
+        timeout=timeout,
+    )
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window_size=100)
+    for value in range(1, 101):
+        tracker.record("together", value / 100)
+    assert tracker.percentile("together", 0.5, min_samples=1) == pytest.approx(0.51)
+    assert tracker.percentile("together", 1.0, min_samples=1) == pytest.approx(1.0)
+    assert tracker.percentile("ollama", 0.5, min_samples=1) is None
+    assert tracker.percentile("together", 0.5, min_samples=101) is None
+
+
+def test_hedge_budget_caps_hedges():
+    budget = HedgeBudget(ratio=0.5, burst=1.0)
+    budget.record_request()
+    assert budget.try_acquire() is False
+    for _ in range(4):
+        budget.record_request()
+    assert budget.try_acquire() is True
+    assert budget.try_acquire() is False
+
+
+def test_fast_primary_is_not_hedged(tracker):
+    primary = FakeAgent("primary")
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=1.0))
+    assert agent.extract_text("image") == "primary"
+    assert backup.calls == 0
+
+
+def test_slow_primary_is_hedged(tracker):
+    release = threading.Event()
+    primary = FakeAgent("primary", release=release)
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=1.0))
+    try:
+        assert agent.extract_text("image") == "backup"
+    finally:
+        release.set()
+    assert backup.calls == 1
+
+
+def test_slow_primary_without_budget_is_not_hedged(tracker):
+    release = threading.Event()
+    primary = FakeAgent("primary", release=release)
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=0.0))
+    threading.Timer(0.05, release.set).start()
+    assert agent.extract_text("image") == "primary"
+    assert backup.calls == 0
+
+
+def test_failed_hedge_falls_back_to_primary(tracker):
+    release = threading.Event()
+    primary = FakeAgent("primary", release=release)
+    backup = FakeAgent("backup", error=RuntimeError("backup failed"))
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=1.0))
+    threading.Timer(0.05, release.set).start()
+    assert agent.extract_text("image") == "primary"
+
+
+def test_hedge_timer_starts_when_primary_runs(tracker):
+    from concurrent.futures import ThreadPoolExecutor
+    from unittest.mock import patch
+
+    blocker = threading.Event()
+    primary = FakeAgent("primary")
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=1.0))
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        # Keep the only worker busy well past the 10 ms hedge delay
+        executor.submit(blocker.wait, 5)
+        threading.Timer(0.1, blocker.set).start()
+        with patch("hedging._executor", executor):
+            assert agent.extract_text("image") == "primary"
+    finally:
+        blocker.set()
+        executor.shutdown()
+    assert backup.calls == 0
+
+
+def test_unhedgeable_primary_runs_on_calling_thread():
+    primary = FakeAgent("primary")
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, LatencyTracker(), HedgeBudget(ratio=1.0))
+    assert agent.extract_text("image") == "primary"
+    assert primary.thread is threading.current_thread()
+
+
+def test_busy_executor_wait_is_bounded_by_timeout(tracker):
+    from concurrent.futures import ThreadPoolExecutor
+    from unittest.mock import patch
+
+    blocker = threading.Event()
+    primary = FakeAgent("primary")
+    backup = FakeAgent("backup")
+    agent = make_agent(primary, backup, tracker, HedgeBudget(ratio=1.0), timeout=0.05)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        executor.submit(blocker.wait, 5)
+        with patch("hedging._executor", executor):
+            with pytest.raises(DeadlineExceeded):
+                agent.extract_text("image")
+    finally:
+        blocker.set()
+        executor.shutdown()
+    assert primary.calls == 0
@@ -5,15 +5,35 @@ Unit tests for image_processor.py
 """
 
 import os
+from io import BytesIO
 from unittest.mock import mock_open, patch
 
+import numpy as np
 import pytest
-from image_processor import ImageProcessor
+from config import AUTO_ENCODING_CANDIDATES, ENCODING_LEGIBILITY_THRESHOLD
+from image_processor import (
+    EncodingStats,
+    ImageProcessor,
+    adaptive_binarize,
+    legibility,
+    normalize_contrast,
+)
+from PIL import Image, ImageDraw
 
 
 @pytest.fixture
 def processor():
-    return ImageProcessor()
+    return ImageProcessor(stats=EncodingStats())
+
+
+@pytest.fixture
+def text_image():
+    image = Image.new("RGB", (400, 120), (235, 235, 225))
+    draw = ImageDraw.Draw(image)
+    draw.text((20, 40), "Invoice 1234 - Total $56.78", fill=(30, 30, 60))
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
 
 
 @pytest.fixture
@@ -60,3 +80,81 @@ def test_encode_image_failure(mock_file, processor, image_paths):
     with patch("os.path.exists", return_value=True):
         with pytest.raises(Exception):
             processor.encode_image(image_paths["valid"])
+
+
+def test_normalize_contrast_stretches_range():
+    gray = np.linspace(100, 150, 10000).reshape(100, 100).astype(np.uint8)
+    normalized = normalize_contrast(gray)
+    assert normalized.min() == 0
+    assert normalized.max() == 255
+
+
+def test_adaptive_binarize_marks_ink():
+    gray = np.full((50, 50), 200, dtype=np.uint8)
+    gray[20:30, 24:26] = 40
+    binary = adaptive_binarize(gray)
+    assert set(np.unique(binary)) == {0, 255}
+    assert (binary[20:30, 24:26] == 0).all()
+    assert binary[0, 0] == 255
+
+
+def test_legibility_rejects_binarized_image(processor):
+    images_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "images")
+    image = Image.open(os.path.join(images_dir, "walmart.png")).convert("RGB")
+    image.thumbnail((512, 512))
+    reference = np.asarray(image.convert("L"))
+
+    for profile, legible in (("gray_webp", True), ("binary_png", False)):
+        encoded, _ = processor.encode_profile(image, profile)
+        decoded = np.asarray(Image.open(BytesIO(encoded)).convert("L"))
+        score = legibility(reference, decoded)
+        assert (score >= ENCODING_LEGIBILITY_THRESHOLD) is legible
+
+
+def test_legibility_of_identical_images():
+    gray = np.random.default_rng(0).integers(0, 256, (40, 40), dtype=np.uint8)
+    assert legibility(gray, gray) == 1.0
+
+
+@pytest.mark.parametrize(
+    "profile, mime_type, mode",
+    [
+        ("rgb_jpeg", "image/jpeg", "RGB"),
+        ("gray_jpeg", "image/jpeg", "L"),
+        ("gray_webp", "image/webp", "RGB"),  # WebP has no grayscale storage
+        ("palette_png", "image/png", "P"),
+        ("binary_png", "image/png", "1"),
+    ],
+)
+def test_process_image_profiles(processor, text_image, profile, mime_type, mode):
+    content, result_mime_type = processor.process_image(text_image, profile)
+    assert result_mime_type == mime_type
+    assert Image.open(BytesIO(content)).mode == mode
+
+
+def test_process_image_auto_picks_smallest(processor, text_image):
+    content, _ = processor.process_image(text_image, "auto")
+    for profile in ("rgb_jpeg", "gray_jpeg"):
+        assert len(content) <= len(processor.process_image(text_image, profile)[0])
+
+
+def test_auto_encoding_stats_use_selected_profile(processor, text_image):
+    content, _, profile = processor.process_image_with_profile(text_image, "auto")
+    assert profile in AUTO_ENCODING_CANDIDATES
+    summary = processor.stats.summary()["profiles"]
+    assert summary[profile]["avg_bytes"] == len(content)
+    assert "auto" not in summary
+
+
+def test_process_image_unsupported_profile(processor, text_image):
+    with pytest.raises(ValueError):
+        processor.process_image(text_image, "tiff")
+
+
+def test_encoding_stats_summary(processor, text_image):
+    processor.process_image(text_image, "gray_jpeg")
+    processor.stats.record_inference("ollama", "gray_jpeg", 0.5)
+    summary = processor.stats.summary()
+    assert summary["profiles"]["gray_jpeg"]["count"] == 1
+    assert summary["profiles"]["gray_jpeg"]["avg_bytes"] > 0
+    assert summary["providers"]["ollama"]["gray_jpeg"]["avg_latency_ms"] == 500.0
@@ -4,10 +4,22 @@
 Unit tests for ocr_agent.py
 """
 
-from unittest.mock import MagicMock, patch
+import base64
+import os
+import socket
+import subprocess
+import sys
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from ocr_agent import TogetherOcrAgent
+from ocr_agent import (
+    OllamaOcrAgent,
+    TogetherOcrAgent,
+    create_ocr_agent,
+    hedge_backup_provider,
+    load_agent_class,
+)
 
 
 @pytest.fixture
@@ -41,3 +53,140 @@ def test_extract_text_failure(mock_together, agent, image_data):
     with pytest.raises(Exception) as exc_info:
         agent.extract_text(image_data["base64_image"])
     assert "API Error" in str(exc_info.value)
+
+
+@pytest.mark.parametrize(
+    "module", ["ocr_agent", "hedging", "routing", "profiling", "api"]
+)
+def test_import_does_not_load_provider_sdks(module):
+    code = f"import sys, {module}; print(sorted({{'ollama', 'together'}} & set(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert output.strip() == "[]"
+
+
+def test_load_agent_class_resolves_registry():
+    assert load_agent_class("together") is TogetherOcrAgent
+    assert load_agent_class("ollama") is OllamaOcrAgent
+
+
+def test_create_ocr_agent_unsupported_provider():
+    with pytest.raises(ValueError, match="Unsupported provider"):
+        create_ocr_agent("unknown")
+
+
+def test_create_ocr_agent_requires_api_key():
+    with pytest.raises(ValueError, match="API key required"):
+        create_ocr_agent("together")
+
+
+@patch("routing.latency_model.choose_provider", return_value="ollama")
+@patch("ocr_agent.load_agent_class")
+def test_create_ocr_agent_auto_routes_provider(mock_load, mock_choose):
+    mock_load.return_value.requires_api_key = False
+    features = {"pixels": 1000.0, "bytes": 500.0}
+
+    agent = create_ocr_agent("auto", features=features)
+
+    mock_choose.assert_called_once_with(features, None)
+    mock_load.assert_called_once_with("ollama")
+    assert agent.provider == "ollama"
+    assert agent.features == features
+
+
+def test_hedge_backup_provider_is_distinct_and_usable():
+    assert hedge_backup_provider("ollama", api_key="key") == "together"
+    assert hedge_backup_provider("ollama", api_key=None) is None
+    assert hedge_backup_provider("together", api_key="key") is None
+
+
+@patch("ocr_agent.load_agent_class")
+def test_create_ocr_agent_skips_hedge_without_backup(mock_load):
+    mock_load.return_value.requires_api_key = False
+
+    agent = create_ocr_agent("together", api_key="key", hedge=True)
+
+    assert type(agent).__name__ == "ObservedOcrAgent"
+
+
+@pytest.fixture
+def hanging_server():
+    """A TCP server that accepts one request, never answers and records the close."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    state = {"received": threading.Event(), "closed": threading.Event()}
+
+    def serve():
+        connection, _ = server.accept()
+        with connection:
+            connection.recv(65536)
+            state["received"].set()
+            while connection.recv(65536):
+                pass
+            state["closed"].set()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}", state
+    server.close()
+
+
+def test_ollama_cancel_closes_in_flight_connection(hanging_server):
+    pytest.importorskip("ollama")
+    from deadline import RequestCancelled
+
+    host, state = hanging_server
+    OllamaOcrAgent._ready_models.add((host, "test-model"))
+    agent = OllamaOcrAgent(model_name="test-model", timeout=30, host=host)
+    errors = []
+
+    def run():
+        try:
+            agent.extract_text(base64.b64encode(b"image").decode("utf-8"))
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    assert state["received"].wait(timeout=5)
+
+    agent.cancel()
+
+    assert state["closed"].wait(timeout=2), "server never saw the connection close"
+    worker.join(timeout=2)
+    assert not worker.is_alive()
+    assert isinstance(errors[0], RequestCancelled)
+
+
+def test_ollama_timeout_raises_deadline_exceeded(hanging_server):
+    pytest.importorskip("ollama")
+    from deadline import DeadlineExceeded
+
+    host, _ = hanging_server
+    OllamaOcrAgent._ready_models.add((host, "test-model"))
+    agent = OllamaOcrAgent(model_name="test-model", timeout=0.2, host=host)
+    with pytest.raises(DeadlineExceeded):
+        agent.extract_text(base64.b64encode(b"image").decode("utf-8"))
+
+
+def test_ready_ollama_agents_reuse_clients():
+    pytest.importorskip("ollama")
+    host = "http://127.0.0.1:1"
+    OllamaOcrAgent._ready_models.add((host, "test-model"))
+    with patch("ollama.Client") as mock_client, patch(
+        "ollama.AsyncClient"
+    ) as mock_async_client:
+        mock_async_client.return_value.chat = AsyncMock(return_value={"response": ""})
+        try:
+            for _ in range(2):
+                agent = OllamaOcrAgent(model_name="test-model", timeout=5, host=host)
+                agent._chat(model="test-model", messages=[])
+        finally:
+            OllamaOcrAgent._async_clients.pop(host, None)
+    mock_client.assert_not_called()
+    mock_async_client.assert_called_once_with(host=host)
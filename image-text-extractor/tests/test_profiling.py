@@ -0,0 +1,94 @@
+# tests/test_profiling.py
+
+"""
+Unit tests for profiling.py
+"""
+
+import time
+
+import pytest
+from profiling import ProfilingController
+
+
+@pytest.fixture
+def controller():
+    return ProfilingController(max_results=2, interval=0.001)
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_claim_disarmed(controller):
+    assert controller.claim() is False
+
+
+def test_claim_next_requests(controller):
+    controller.arm(requests=2)
+    assert controller.claim() is True
+    assert controller.claim() is True
+    assert controller.claim() is False
+
+
+def test_claim_time_window(controller):
+    controller.arm(seconds=0.05)
+    assert controller.claim() is True
+    time.sleep(0.06)
+    assert controller.claim() is False
+
+
+def test_disarm(controller):
+    controller.arm(requests=5, seconds=60)
+    controller.disarm()
+    assert controller.claim() is False
+
+
+def test_profile_stores_folded_stacks(controller):
+    with controller.profile("abc123"):
+        busy_wait(0.05)
+    folded = controller.get("abc123")
+    assert "busy_wait (test_profiling.py:" in folded
+    stack, count = folded.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert controller.status()["profiles"] == ["abc123"]
+
+
+def test_profile_results_are_bounded(controller):
+    for request_id in ("a", "b", "c"):
+        with controller.profile(request_id):
+            pass
+    assert controller.get("a") is None
+    assert controller.status()["profiles"] == ["b", "c"]
+
+
+def test_profile_covers_hedge_worker_threads(controller):
+    from hedging import HedgeBudget, HedgedOcrAgent, LatencyTracker
+    from ocr_agent import BaseOcrAgent
+
+    class BusyAgent(BaseOcrAgent):
+        def extract_text(self, base64_image, mime_type="image/jpeg"):
+            busy_wait(0.05)
+            return "text"
+
+    # Enough tracked latency for a hedge to be possible, so the primary runs
+    # on a hedge worker rather than the calling thread
+    tracker = LatencyTracker()
+    for _ in range(50):
+        tracker.record("ollama", 5.0)
+    agent = HedgedOcrAgent(
+        provider="ollama",
+        primary=BusyAgent(),
+        backup_provider="together",
+        backup_factory=BusyAgent,
+        tracker=tracker,
+        budget=HedgeBudget(),
+    )
+    with controller.profile("hedged"):
+        assert agent.extract_text("image") == "text"
+
+    hedge_stacks = [
+        line for line in controller.get("hedged").splitlines() if "ocr-hedge" in line
+    ]
+    assert any("busy_wait (test_profiling.py:" in line for line in hedge_stacks)
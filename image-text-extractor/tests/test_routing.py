@@ -0,0 +1,127 @@
+# tests/test_routing.py
+
+"""
+Unit tests for routing.py
+"""
+
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from deadline import RequestCancelled
+from hedging import LatencyTracker
+from routing import LatencyModel, ObservedOcrAgent, ProviderModel, feature_vector
+
+SMALL = {"pixels": 100_000, "bytes": 20_000}
+LARGE = {"pixels": 250_000, "bytes": 200_000}
+
+
+@pytest.fixture
+def model():
+    return LatencyModel(exploration_rate=0.0)
+
+
+def train(model, provider, base, per_megapixel, samples=30):
+    for features in (SMALL, LARGE) * (samples // 2):
+        seconds = base + per_megapixel * features["pixels"] / 1e6
+        model.observe(provider, features, seconds)
+
+
+def test_provider_model_uses_prior_until_fitted():
+    provider_model = ProviderModel(prior_latency=7.0)
+    x = feature_vector(SMALL)
+    assert provider_model.predict(x) == 7.0
+    for _ in range(10):
+        provider_model.observe(x, 2.0)
+    assert provider_model.predict(x) == pytest.approx(2.0, abs=0.05)
+
+
+def test_provider_model_learns_feature_dependence():
+    provider_model = ProviderModel(prior_latency=1.0)
+    for features in (SMALL, LARGE) * 20:
+        provider_model.observe(
+            feature_vector(features), 1.0 + 20.0 * features["pixels"] / 1e6
+        )
+    assert provider_model.predict(feature_vector(LARGE)) == pytest.approx(6.0, abs=0.2)
+    assert provider_model.predict(feature_vector(SMALL)) == pytest.approx(3.0, abs=0.2)
+
+
+def test_provider_model_bounds_covariance():
+    provider_model = ProviderModel(prior_latency=2.0, max_covariance_trace=3000.0)
+    for features in (SMALL, LARGE) * 20:
+        provider_model.observe(feature_vector(features), 2.0)
+    # A long run of same-sized images leaves the other directions unexcited
+    for _ in range(2000):
+        provider_model.observe(feature_vector(SMALL), 2.0)
+    assert np.trace(provider_model.covariance) <= 3000.0 + 1e-6
+    # One slow large image must not overwrite the fit on its own
+    provider_model.observe(feature_vector(LARGE), 3.0)
+    assert provider_model.predict(feature_vector(LARGE)) < 2.5
+
+
+def test_choose_provider_requires_api_key_for_together(model):
+    train(model, "together", 0.5, 1.0)
+    train(model, "ollama", 20.0, 10.0)
+    assert model.choose_provider(SMALL, api_key=None) == "ollama"
+    assert model.choose_provider(SMALL, api_key="key") == "together"
+
+
+def test_choose_provider_accounts_for_queue_depth(model):
+    train(model, "together", 4.0, 0.0)
+    train(model, "ollama", 3.0, 0.0)
+    assert model.choose_provider(SMALL, api_key="key") == "ollama"
+    model.begin("ollama")
+    assert model.choose_provider(SMALL, api_key="key") == "together"
+    model.end("ollama")
+    assert model.choose_provider(SMALL, api_key="key") == "ollama"
+
+
+@patch("routing.AUTO_COST_CEILING", 0.0)
+def test_choose_provider_respects_cost_ceiling(model):
+    train(model, "together", 0.5, 0.0)
+    train(model, "ollama", 60.0, 0.0)
+    assert model.eligible_providers(SMALL, api_key="key") == ["ollama"]
+    assert model.choose_provider(SMALL, api_key="key") == "ollama"
+
+
+def test_observed_agent_feeds_model(model):
+    agent = MagicMock()
+    agent.extract_text.return_value = "text"
+    tracker = LatencyTracker()
+    observed = ObservedOcrAgent("ollama", agent, SMALL, model=model, tracker=tracker)
+    assert observed.extract_text("image") == "text"
+    assert tracker.percentile("ollama", 0.5, min_samples=1) is not None
+    summary = model.summary()["ollama"]
+    assert summary["samples"] == 1
+    assert summary["in_flight"] == 0
+
+
+def test_observed_agent_records_cancelled_call(model):
+    agent = MagicMock()
+    agent.extract_text.side_effect = RequestCancelled("cancelled")
+    tracker = LatencyTracker()
+    observed = ObservedOcrAgent("ollama", agent, SMALL, model=model, tracker=tracker)
+    with pytest.raises(RequestCancelled):
+        observed.extract_text("image")
+    assert tracker.percentile("ollama", 0.5, min_samples=1) is not None
+    assert model.summary()["ollama"]["in_flight"] == 0
+
+
+def test_routing_moves_off_failing_provider(model):
+    train(model, "together", 0.5, 1.0)
+    train(model, "ollama", 20.0, 10.0)
+    assert model.choose_provider(SMALL, api_key="key") == "together"
+
+    agent = MagicMock()
+    agent.extract_text.side_effect = RuntimeError("401 Unauthorized")
+    observed = ObservedOcrAgent(
+        "together", agent, SMALL, model=model, tracker=LatencyTracker()
+    )
+    for _ in range(10):
+        with pytest.raises(RuntimeError):
+            observed.extract_text("image")
+    assert model.choose_provider(SMALL, api_key="key") == "ollama"
+
+
+def test_feature_vector_defaults():
+    assert np.array_equal(feature_vector(None), np.array([1.0, 0.0, 0.0]))
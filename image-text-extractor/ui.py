@@ -57,6 +57,11 @@ def main():
             if not api_key:
                 st.warning("Please enter your Together AI API Key.")
                 return
+        elif provider == "auto":
+            api_key = st.text_input(
+                "Together AI API Key (optional, lets auto use Together AI):",
+                type="password",
+            )
 
         system_prompt = st.text_area(
             "System Prompt:",